@@ -1,4 +1,10 @@
 import json
+import gzip
+import hashlib
+import heapq
+import sqlite3
+import tempfile
+from operator import itemgetter
 import pandas
 from datetime import datetime
 from datetime import date
@@ -7,114 +13,449 @@ import logging
 import dotenv
 import os
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# File extensions added to written files for each supported outputCompression value
+COMPRESSION_EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# Lowest and highest compressionLevel accepted by each outputCompression codec
+COMPRESSION_LEVELS = {"gzip": (0, 9), "zstd": (1, 22)}
+
+# Load steps a fused load can save as csv files, Condensed is always saved since incremental loads compare against it
+LOAD_STEPS = ("Condensed", "Intra-File-Compared", "Old-New-Compare")
+
+# Fields compared between the previous and current condensed records, addresses and phone numbers are left out
+STAFF_COMPARED_FIELDS = ["EmplClass", "EmplStatus", "LastName", "FirstName", "MiddleName", "Email_Address", "barcode", "Pronoun"]
+STUDENT_COMPARED_FIELDS = ["AcadCareer1", "AcadCareer2", "AcadCareer3", "AcadProg1", "AcadProg2", "AcadProg3",
+                           "LastName", "FirstName", "MiddleName", "Email_Address",
+                           "TermDescr1", "TermDescr2", "TermDescr3", "barcode", "Pronoun"]
+
+# Ways of resolving patrons that share a barcode or username, see uniquenessCheck
+UNIQUENESS_POLICIES = ("drop", "keep-first", "fail")
+
+# Output fields left out of patron digests, expiration dates move with the run date rather than the patron data
+DIGEST_EXCLUDED_FIELDS = ("expirationDate",)
+
+# Maximum number of EMPLIDs bound to a single state store query
+STATE_STORE_QUERY_SIZE = 900
+
+# Number of records held in memory by the external sort before a sorted run is spilled to disk
+DEFAULT_SORT_BUFFER_SIZE = 100000
+
+
+# Opens a text file for reading or writing, transparently (de)compressing it when named *.gz or *.zst.
+# A compression level of None uses the compression library's default. newline is passed on as for open(), handles
+# given to DataFrame.to_csv need newline='' since pandas writes its own line endings.
+def openPatronFile(file_name, mode='r', compression_level=None, newline=None):
+    if file_name.endswith('.gz'):
+        if compression_level is None:
+            return gzip.open(file_name, f'{mode}t', encoding='utf-8', newline=newline)
+        return gzip.open(file_name, f'{mode}t', compresslevel=compression_level,
+                         encoding='utf-8', newline=newline)
+    if file_name.endswith('.zst'):
+        if zstandard is None:
+            logging.critical('The zstandard package is required to read or write \"%s\"', file_name)
+            raise ImportError('The zstandard package is required for .zst files')
+        compressor = None
+        if 'w' in mode and compression_level is not None:
+            compressor = zstandard.ZstdCompressor(level=compression_level)
+        return zstandard.open(file_name, f'{mode}t', cctx=compressor, encoding='utf-8', newline=newline)
+    return open(file_name, mode, encoding='utf-8', newline=newline)
+
+
+# Sorts patron records on a key within a fixed memory budget, spilling sorted runs to disk and merging them back.
+# Like sorted() the sort is stable, records sharing a key keep their input order.
+# Used for records streamed from disk, records already held in memory are sorted in place with list.sort instead.
+def externalSortRecords(records, key="EMPLID", buffer_size=None, spill_directory=None):
+    if buffer_size is None:
+        buffer_size = int(os.getenv('sortBufferSize') or DEFAULT_SORT_BUFFER_SIZE)
+    if buffer_size < 1:
+        raise ValueError('The sort buffer size must be at least 1')
+    if spill_directory is None:
+        spill_directory = os.getenv('sortSpillDirectory') or None
+    sort_key = itemgetter(key)
+    run_files = []
+    buffer = []
+    try:
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= buffer_size:
+                run_files.append(_spillSortedRun(buffer, sort_key, spill_directory))
+                buffer = []
+        buffer.sort(key=sort_key)
+        if not run_files:
+            yield from buffer
+            return
+
+        logging.info('Merging %s sorted runs spilled to disk...', len(run_files))
+        runs = [_readSortedRun(run_file) for run_file in run_files]
+        # The final, partially filled run stays in memory and is merged last to keep the sort stable
+        runs.append(iter(buffer))
+        yield from heapq.merge(*runs, key=sort_key)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+
+# Sorts a buffer of records and writes it to a temporary json lines file, which is removed once closed
+def _spillSortedRun(buffer, sort_key, spill_directory):
+    buffer.sort(key=sort_key)
+    run_file = tempfile.TemporaryFile(mode='w+', encoding='utf-8', dir=spill_directory)
+    for record in buffer:
+        run_file.write(f"{json.dumps(record, default=str)}\n")
+    run_file.seek(0)
+    return run_file
+
+
+# Reads the records of a spilled run back in order
+def _readSortedRun(run_file):
+    for line in run_file:
+        yield json.loads(line)
+
+
+# Returns True if the records are in ascending key order
+def isSortedRecords(records, key="EMPLID"):
+    last_key = None
+    for record in records:
+        if last_key is not None and record[key] < last_key:
+            return False
+        last_key = record[key]
+    return True
+
+
+# SQLite store of the last patron json sent to FOLIO for each EMPLID, indexed by EMPLID, barcode and username
+class PatronStateStore:
+    def __init__(self, database_name):
+        logging.info('Opening patron state store... \"%s\"...', database_name)
+        self.connection = sqlite3.connect(database_name)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS patrons (
+                                       emplid TEXT PRIMARY KEY,
+                                       barcode TEXT,
+                                       username TEXT,
+                                       digest TEXT NOT NULL,
+                                       patron_json TEXT NOT NULL,
+                                       updated TEXT NOT NULL)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS patrons_barcode ON patrons (barcode)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS patrons_username ON patrons (username)")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS patrons_username_nocase ON patrons (username COLLATE NOCASE)")
+        self.connection.commit()
+
+    # Returns the EMPLID a patron json record was built for
+    @staticmethod
+    def patronEMPLID(patron):
+        return patron["externalSystemId"].split("@")[0]
+
+    # Returns a digest of the patron json record, ignoring fields that change with the run date
+    @staticmethod
+    def patronDigest(patron):
+        digested = {field: value for field, value in patron.items() if field not in DIGEST_EXCLUDED_FIELDS}
+        return hashlib.sha256(json.dumps(digested, sort_keys=True).encode('utf-8')).hexdigest()
+
+    # Returns the stored digests for the given EMPLIDs, EMPLIDs not in the store are left out
+    def getDigests(self, emplids):
+        emplids = list(emplids)
+        digests = {}
+        for start in range(0, len(emplids), STATE_STORE_QUERY_SIZE):
+            chunk = emplids[start:start + STATE_STORE_QUERY_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            digests.update(self.connection.execute(
+                f"SELECT emplid, digest FROM patrons WHERE emplid IN ({placeholders})", chunk))
+        return digests
+
+    # Returns (value, EMPLID) pairs for stored patrons holding any of the given barcodes or usernames,
+    # usernames are matched case-insensitively
+    def getOwners(self, column, values):
+        collation = " COLLATE NOCASE" if column == "username" else ""
+        values = list(values)
+        owners = []
+        for start in range(0, len(values), STATE_STORE_QUERY_SIZE):
+            chunk = values[start:start + STATE_STORE_QUERY_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            owners.extend(self.connection.execute(
+                f"SELECT {column}, emplid FROM patrons WHERE {column}{collation} IN ({placeholders})", chunk))
+        return owners
+
+    # Inserts or replaces the stored json for each patron record in a single transaction
+    def upsertPatrons(self, patrons):
+        updated = datetime.now().isoformat(timespec='seconds')
+        rows = [(self.patronEMPLID(patron), patron["barcode"], patron["username"],
+                 self.patronDigest(patron), json.dumps(patron), updated) for patron in patrons]
+        with self.connection:
+            self.connection.executemany("""INSERT INTO patrons (emplid, barcode, username, digest, patron_json, updated)
+                                           VALUES (?, ?, ?, ?, ?, ?)
+                                           ON CONFLICT (emplid) DO UPDATE SET
+                                               barcode = excluded.barcode,
+                                               username = excluded.username,
+                                               digest = excluded.digest,
+                                               patron_json = excluded.patron_json,
+                                               updated = excluded.updated""", rows)
+        logging.info('Patron state store updated: %s records', len(rows))
+
+    # Returns the last patron json sent for an EMPLID, or None
+    def getByEMPLID(self, emplid):
+        return self._getOne("emplid", emplid)
+
+    # Returns the last patron json sent with a barcode, or None
+    def getByBarcode(self, barcode):
+        return self._getOne("barcode", barcode)
+
+    # Returns the last patron json sent with a username, or None
+    def getByUsername(self, username):
+        return self._getOne("username", username)
+
+    def _getOne(self, column, value):
+        row = self.connection.execute(
+            f"SELECT patron_json FROM patrons WHERE {column} = ? ORDER BY updated DESC LIMIT 1", (value,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def close(self):
+        self.connection.close()
+
 
 class PatronDataTransformer:
-    def __init__(self, config_name, time):
+    # Staff/student data can be passed in directly as DataFrames, Arrow tables or iterables of dicts.
+    # Any data not passed in is read from the files named in the config. Setting persist to False
+    # keeps the whole load in memory: no intermediate files, config updates or output files are written.
+    # state_store may be a PatronStateStore or a database file name, by default the patronStateStore config is used.
+    # With persist set to False the patronStateStore config is ignored, a state store is only used if passed in.
+    # fused and checkpoints override the fusedPipeline and checkpoints config, see _prepareFusedLoad.
+    # A fused load only keeps its changed records for getChangeSet when keep_change_set is set.
+    def __init__(self, config_name, time=None, staff_data=None, student_data=None,
+                 previous_staff_data=None, previous_student_data=None, full_load=None, persist=True,
+                 state_store=None, fused=None, checkpoints=None, keep_change_set=False):
         logging.info("Initializing patron data converter...")
         self.config_file_name = config_name
+        self.persist = persist
+
+        if state_store is None and self.persist:
+            state_store = os.getenv('patronStateStore') or None
+        if isinstance(state_store, str):
+            state_store = PatronStateStore(state_store)
+        self.state_store = state_store
+
+        self.uniqueness_policy = (os.getenv('uniquenessPolicy') or 'drop').lower()
+        if self.uniqueness_policy not in UNIQUENESS_POLICIES:
+            logging.critical('Invalid uniquenessPolicy value. Use drop, keep-first or fail')
+            raise ValueError('Invalid uniquenessPolicy value. Use drop, keep-first or fail')
+        self.conflicts = []
+
+        if fused is not None:
+            self.fused = bool(fused)
+        elif (os.getenv('fusedPipeline') or 'false').lower() in ('true', '1', 't'):
+            self.fused = True
+        elif (os.getenv('fusedPipeline') or 'false').lower() in ('false', '0', 'f'):
+            self.fused = False
+        else:
+            logging.critical('Invalid fusedPipeline value. Use True or False')
+            raise ValueError('Invalid fusedPipeline value. Use True or False')
+        if checkpoints is None:
+            checkpoints = os.getenv('checkpoints') or ''
+        if isinstance(checkpoints, str):
+            checkpoints = [checkpoint.strip() for checkpoint in checkpoints.split(',') if checkpoint.strip()]
+        for checkpoint in checkpoints:
+            if checkpoint not in LOAD_STEPS:
+                logging.critical('Invalid checkpoints value: %s. Use Condensed, Intra-File-Compared or Old-New-Compare',
+                                 checkpoint)
+                raise ValueError('Invalid checkpoints value. Use Condensed, Intra-File-Compared or Old-New-Compare')
+        self.checkpoints = set(checkpoints) | {"Condensed"}
+        self.keep_change_set = keep_change_set
+        self.fused_records = None
+        self.bytes_read = 0
+        self.bytes_written = 0
 
-        # Read staff file
         try:
-            logging.info('Reading staff file... \"%s\"...',
-                         os.getenv('staffFileName'))
-            with open(os.getenv('staffFileName'), 'r', encoding='utf-8') as file:
-                headers = file.readline().strip().split('|')
-                self.staff_CSV = pandas.read_csv(
-                file, names=headers, delimiter="|", dtype="string")
-        except FileNotFoundError as exc:
-            logging.critical('Staff load file, \"%s\", not found',
+            self.sort_buffer_size = int(os.getenv('sortBufferSize') or DEFAULT_SORT_BUFFER_SIZE)
+        except ValueError as exc:
+            logging.critical('Invalid sortBufferSize value. Use a whole number of at least 1')
+            raise ValueError('Invalid sortBufferSize value. Use a whole number of at least 1') from exc
+        if self.sort_buffer_size < 1:
+            logging.critical('Invalid sortBufferSize value. Use a whole number of at least 1')
+            raise ValueError('Invalid sortBufferSize value. Use a whole number of at least 1')
+
+        compression = (os.getenv('outputCompression') or 'none').lower()
+        if compression not in COMPRESSION_EXTENSIONS:
+            logging.critical('Invalid outputCompression value. Use none, gzip or zstd')
+            raise ValueError('Invalid outputCompression value. Use none, gzip or zstd')
+        self.compression_extension = COMPRESSION_EXTENSIONS[compression]
+        try:
+            self.compression_level = int(os.getenv('compressionLevel')) if os.getenv('compressionLevel') else None
+        except ValueError as exc:
+            logging.critical('Invalid compressionLevel value. Use a whole number')
+            raise ValueError('Invalid compressionLevel value. Use a whole number') from exc
+        if self.compression_level is not None and compression in COMPRESSION_LEVELS:
+            lowest, highest = COMPRESSION_LEVELS[compression]
+            if not lowest <= self.compression_level <= highest:
+                logging.critical('Invalid compressionLevel value for %s. Use %s to %s', compression, lowest, highest)
+                raise ValueError(f'Invalid compressionLevel value for {compression}. Use {lowest} to {highest}')
+
+        # Read staff file
+        if staff_data is not None:
+            logging.info("Reading staff data from memory...")
+            self.staff_CSV = self._toDataFrame(staff_data)
+        else:
+            try:
+                logging.info('Reading staff file... \"%s\"...',
                              os.getenv('staffFileName'))
-            raise FileNotFoundError from exc
-        finally:
-            logging.info("Sorting staff...")
-            self.staff_CSV.sort_values("EMPLID")
-            self.staff_CSV.fillna("", inplace=True)
+                with openPatronFile(os.getenv('staffFileName')) as file:
+                    headers = file.readline().strip().split('|')
+                    self.staff_CSV = pandas.read_csv(
+                    file, names=headers, delimiter="|", dtype="string")
+                self._countBytesRead(os.getenv('staffFileName'))
+            except FileNotFoundError as exc:
+                logging.critical('Staff load file, \"%s\", not found',
+                                 os.getenv('staffFileName'))
+                raise FileNotFoundError from exc
+        self.staff_CSV.fillna("", inplace=True)
 
         # Read student file
-        try:
-            logging.info('Reading student file... \"%s\"...',
-                         os.getenv('studentFileName'))
-            with open(os.getenv('studentFileName'), 'r', encoding='utf-8') as file:
-                headers = file.readline().strip().split('|')
-                self.student_CSV = pandas.read_csv(
-                    file, names=headers, delimiter='|', dtype='string')
-        except FileNotFoundError as exc:
-            logging.critical('Student load file, \"%s\", not found',
+        if student_data is not None:
+            logging.info("Reading student data from memory...")
+            self.student_CSV = self._toDataFrame(student_data)
+        else:
+            try:
+                logging.info('Reading student file... \"%s\"...',
                              os.getenv('studentFileName'))
-            raise FileNotFoundError from exc
-        finally:
-            logging.info("Sorting students...")
-            self.student_CSV.sort_values("EMPLID")
-            self.student_CSV.fillna("", inplace=True)
+                with openPatronFile(os.getenv('studentFileName')) as file:
+                    headers = file.readline().strip().split('|')
+                    self.student_CSV = pandas.read_csv(
+                        file, names=headers, delimiter='|', dtype='string')
+                self._countBytesRead(os.getenv('studentFileName'))
+            except FileNotFoundError as exc:
+                logging.critical('Student load file, \"%s\", not found',
+                                 os.getenv('studentFileName'))
+                raise FileNotFoundError from exc
+        self.student_CSV.fillna("", inplace=True)
 
-        if os.getenv('fullLoad').lower() in ('true', '1', 't'):
+        if full_load is not None:
+            self.full_load = bool(full_load)
+        elif os.getenv('fullLoad', '').lower() in ('true', '1', 't'):
             self.full_load = True
-        elif os.getenv('fullLoad').lower() in ('false', '0', 'f'):
+        elif os.getenv('fullLoad', '').lower() in ('false', '0', 'f'):
             self.full_load = False
         else:
             logging.critical('Invalid fullLoad value. Use True or False')
             raise ValueError('Invalid fullLoad value. Use True or False')
 
-        if not self.full_load:
+        # Incremental loads with a state store are compared at the output level, previous files are not needed.
+        # Previous files are streamed by _iterPreviousRecords during the comparison rather than read here
+        self.previous_staff_CSV = None
+        self.previous_student_CSV = None
+        self.previous_staff_file_name = None
+        self.previous_student_file_name = None
+        if not self.full_load and self.state_store is None:
             # Read previous staff file
-            try:
-                logging.info('Reading previous staff file... \"%s\"...',
-                             os.getenv('previousStaffCondense'))
-                self.previous_staff_CSV = pandas.read_csv(
-                    os.getenv('previousStaffCondense'), delimiter="|", dtype="string")
-            except FileNotFoundError as exc:
-                logging.critical('Previous staff load file, \"%s\", not found', os.getenv(
-                    'previousStaffCondense'))
-                raise FileNotFoundError from exc
-            finally:
-                logging.info("Sorting previous staff...")
-                self.previous_staff_CSV.sort_values("EMPLID")
+            if previous_staff_data is not None:
+                logging.info("Reading previous staff data from memory...")
+                self.previous_staff_CSV = self._toDataFrame(previous_staff_data)
                 self.previous_staff_CSV.fillna("", inplace=True)
+            else:
+                self.previous_staff_file_name = os.getenv('previousStaffCondense')
+                if not os.path.isfile(self.previous_staff_file_name or ''):
+                    logging.critical('Previous staff load file, \"%s\", not found', os.getenv(
+                        'previousStaffCondense'))
+                    raise FileNotFoundError(f"Previous staff load file not found: {self.previous_staff_file_name}")
+                logging.info('Previous staff file will be streamed... \"%s\"...', self.previous_staff_file_name)
 
             # Read previous student file
-            try:
-                logging.info('Reading previous student file... \"%s\"...', os.getenv(
-                    'previousStudentCondense'))
-                self.previous_student_CSV = pandas.read_csv(
-                    os.getenv('previousStudentCondense'), delimiter="|", dtype="string")
-            except FileNotFoundError as exc:
-                logging.critical('Previous student load file, \"%s\", not found', os.getenv(
-                    'previousStudentCondense'))
-                raise FileNotFoundError from exc
-            finally:
-                logging.info("Sorting previous students...")
-                self.previous_student_CSV.sort_values("EMPLID")
+            if previous_student_data is not None:
+                logging.info("Reading previous student data from memory...")
+                self.previous_student_CSV = self._toDataFrame(previous_student_data)
                 self.previous_student_CSV.fillna("", inplace=True)
+            else:
+                self.previous_student_file_name = os.getenv('previousStudentCondense')
+                if not os.path.isfile(self.previous_student_file_name or ''):
+                    logging.critical('Previous student load file, \"%s\", not found', os.getenv(
+                        'previousStudentCondense'))
+                    raise FileNotFoundError(f"Previous student load file not found: {self.previous_student_file_name}")
+                logging.info('Previous student file will be streamed... \"%s\"...', self.previous_student_file_name)
 
-        logging.info("Files read and sorted")
+        logging.info("Files read")
 
         # Initializes blank Output file dicts
         self.student_out = []
         self.staff_out = []
-
-        self.time = time
-        if os.getenv('destinationFolder') == '':
-            self.patron_out_file_name = 'umpatrons.json'
-        elif os.getenv('destinationFolder')[-1:] == '/':
-            self.patron_out_file_name = f'{os.getenv("destinationFolder")}umpatrons.json'
-            self.dated_out_file_name = f'{os.getenv("destinationFolder")}{datetime.today().day}-{datetime.today().month}-{datetime.today().year}-umpatrons.json'
+        # Staff left out of a full load that are recorded in the state store all the same
+        self.staff_left_out = []
+        # Condensed records, saved for the next incremental load without the EMPLIDs left out by uniquenessCheck
+        self.condensed = {"Staff": None, "Student": None}
+        self.dropped_emplids = set()
+
+        self.time = time if time is not None else datetime.now()
+        if not self.persist:
+            self.patron_out_file_name = None
+            self.dated_out_file_name = None
+            logging.info('Persistence disabled, prepared load will be kept in memory')
         else:
-            self.patron_out_file_name = f'{os.getenv("destinationFolder")}/umpatrons.json'
-            self.dated_out_file_name = f'{os.getenv("destinationFolder")}/{datetime.today().day}-{datetime.today().month}-{datetime.today().year}-umpatrons.json'
+            destination_folder = os.getenv('destinationFolder', '')
+            out_name = f'umpatrons.json{self.compression_extension}'
+            dated_name = f'{datetime.today().day}-{datetime.today().month}-{datetime.today().year}-{out_name}'
+            if destination_folder == '':
+                self.patron_out_file_name = out_name
+                self.dated_out_file_name = dated_name
+            elif destination_folder[-1:] == '/':
+                self.patron_out_file_name = f'{destination_folder}{out_name}'
+                self.dated_out_file_name = f'{destination_folder}{dated_name}'
+            else:
+                self.patron_out_file_name = f'{destination_folder}/{out_name}'
+                self.dated_out_file_name = f'{destination_folder}/{dated_name}'
 
-        logging.info('Prepared load file will be saved as: %s',
-                     self.patron_out_file_name)
+            logging.info('Prepared load file will be saved as: %s',
+                         self.patron_out_file_name)
         self._logElapsedTime()
         logging.info("Patron data converter initialized\n")
 
+    # Iterates over the rows of a DataFrame as dicts
+    @staticmethod
+    def _iterRecords(frame):
+        for row in frame.itertuples():
+            yield row._asdict()
+
+    # Converts in-memory patron data (DataFrame, Arrow table or iterable of dicts) into a string typed DataFrame
+    @staticmethod
+    def _toDataFrame(data):
+        if isinstance(data, pandas.DataFrame):
+            frame = data.copy()
+        elif hasattr(data, "to_pandas"):
+            frame = data.to_pandas()
+        else:
+            records = []
+            for item in data:
+                # Arrow record batches are expanded into their rows
+                if hasattr(item, "to_pylist"):
+                    records.extend(item.to_pylist())
+                else:
+                    records.append(item)
+            frame = pandas.DataFrame(records)
+        return frame.astype("string")
+
     # Logs time elapsed since the time passed into the object on initialization  
     def _logElapsedTime(self):
         time_now = datetime.now()
         elapsed_time = time_now - self.time
         logging.info('Total elapsed time (seconds): %s', elapsed_time.seconds)
 
+    # Adds the on-disk size of a file that has been read to the running total
+    def _countBytesRead(self, file_name):
+        file_bytes = os.path.getsize(file_name)
+        self.bytes_read += file_bytes
+        logging.info('Bytes read from %s: %s', file_name, file_bytes)
+
+    # Adds the on-disk size of a file that has been written to the running total
+    def _countBytesWritten(self, file_name):
+        file_bytes = os.path.getsize(file_name)
+        self.bytes_written += file_bytes
+        logging.info('Bytes written to %s: %s', file_name, file_bytes)
+
     # Update Config File with changed
     def _updateConfig(self, config_field, data):
+        if not self.persist:
+            return
         try:
             os.environ[config_field] = data
             dotenv.set_key(self.config_file_name, config_field, data)
@@ -126,11 +467,16 @@ class PatronDataTransformer:
         self.staffCondense()
         self.studentCondense()
         self.recordComparisons()
-        self.staffChanges()
-        self.studentChanges()
+        if self.state_store is None:
+            self.staffChanges()
+            self.studentChanges()
         self.transformStudentRecords()
         self.transformStaffRecords()
+        self.uniquenessCheck()
+        if self.state_store is not None:
+            self.outputChanges()
         self.saveLoadData()
+        self.saveCondensedData()
 
     # Executes all steps involved in a FULL data load
     def _prepareFullLoad(self):
@@ -139,56 +485,155 @@ class PatronDataTransformer:
         self.recordComparisons()
         self.transformStudentRecords()
         self.transformStaffRecords()
+        self.uniquenessCheck()
+        if self.state_store is not None:
+            self.outputChanges()
+        self.saveLoadData()
+        self.saveCondensedData()
+
+    # Executes a FULL or INCREMENTAL data load as a single pass over each record stream. Records stay as dicts between
+    # steps, DataFrames are only built for the load steps listed in self.checkpoints
+    def _prepareFusedLoad(self):
+        logging.info("Preparing fused patron load...\n")
+        staff_counts = {"skipped": 0, "staff_removed": 0, "updated": 0, "new": 0, "defaulted": 0, "no_barcode": 0}
+        student_counts = {"skipped": 0, "students_removed": 0, "updated": 0, "new": 0, "defaulted": 0}
+
+        # Condensed records are kept in full, each population is filtered using the other's EMPLIDs
+        staff_records = self.staffDeDupe(self._condenseStaff(self._iterRecords(self.staff_CSV), staff_counts))
+        student_records = list(self._condenseStudents(self._iterRecords(self.student_CSV), student_counts))
+        self.condensed["Staff"] = staff_records
+        self.condensed["Student"] = student_records
+        logging.info('Condensed Staff Records: %s, Skipped: %s', len(staff_records), staff_counts["skipped"])
+        logging.info('Condensed Student Records: %s, Skipped: %s', len(student_records), student_counts["skipped"])
+
+        student_ids = {student["EMPLID"] for student in student_records}
+        staff_records = list(self._removeStaffStudents(staff_records, student_ids, staff_counts))
+        staff_ids = {staff["EMPLID"] for staff in staff_records}
+        student_records = self._removeStudentStaff(student_records, staff_ids, student_counts)
+        staff_records = self._checkpoint("Staff", "Intra-File-Compared", staff_records)
+        student_records = self._checkpoint("Student", "Intra-File-Compared", student_records)
+
+        if not self.full_load and self.state_store is None:
+            staff_records = self._changedRecords(self.previous_staff_CSV, self.previous_staff_file_name,
+                                                 staff_records, STAFF_COMPARED_FIELDS, "Staff", staff_counts)
+            student_records = self._changedRecords(self.previous_student_CSV, self.previous_student_file_name,
+                                                   student_records, STUDENT_COMPARED_FIELDS, "Student",
+                                                   student_counts)
+            staff_records = self._checkpoint("Staff", "Old-New-Compare", staff_records)
+            student_records = self._checkpoint("Student", "Old-New-Compare", student_records)
+
+        if self.keep_change_set:
+            self.fused_records = {"staff": [], "student": []}
+        for staff in staff_records:
+            if self.keep_change_set:
+                self.fused_records["staff"].append(staff)
+            patron_json = self._transformStaff(staff, staff_counts)
+            if patron_json is not None:
+                self.staff_out.append(patron_json)
+        for student in student_records:
+            if self.keep_change_set:
+                self.fused_records["student"].append(student)
+            self.student_out.append(self._transformStudent(student, student_counts))
+        # The condensed records stay in self.condensed, the intermediate lists and EMPLID sets are no longer needed
+        del staff_records, student_records, staff_ids, student_ids
+
+        logging.info('Staff Records Removed: %s', staff_counts["staff_removed"])
+        logging.info('Student Records Removed: %s', student_counts["students_removed"])
+        if not self.full_load and self.state_store is None:
+            logging.info('Staff Updated: %s, New: %s', staff_counts["updated"], staff_counts["new"])
+            logging.info('Student Updated: %s, New: %s', student_counts["updated"], student_counts["new"])
+        logging.info('Staff with no barcodes: %s', staff_counts["no_barcode"])
+        logging.info(
+            'Staff defaulted to the \'Staff\' patron group: %s', staff_counts["defaulted"])
+        logging.info(
+            'Students defaulted to the \'Undergraduate\' patron group: %s', student_counts["defaulted"])
+        logging.info('%s Staff Records Converted', len(self.staff_out))
+        logging.info('%s Student Records Converted', len(self.student_out))
+        self._logElapsedTime()
+        logging.info("Fused patron load prepared\n")
+
+        self.uniquenessCheck()
+        if self.state_store is not None:
+            self.outputChanges()
         self.saveLoadData()
+        self.saveCondensedData()
 
-    # Calls the load function indicated by the config
+    # Calls the load function indicated by the config and returns the prepared patron records
     def preparePatronLoad(self):
-        if self.full_load:
+        if self.fused:
+            self._prepareFusedLoad()
+        elif self.full_load:
             self._prepareFullLoad()
         else:
             self._prepareIncrementalLoad()
+        logging.info('Total bytes read: %s', self.bytes_read)
+        logging.info('Total bytes written: %s', self.bytes_written)
         self._logElapsedTime()
+        return self.getPatronRecords()
+
+    # Returns the prepared patron records in load order, staff first
+    def getPatronRecords(self):
+        return self.staff_out + self.student_out
+
+    # Returns the prepared patron records as a newline delimited json string, for library callers. Load files are
+    # written a record at a time by saveLoadData instead
+    def getPatronNDJSON(self):
+        return "".join(f"{json.dumps(patron)}\n" for patron in self.getPatronRecords())
+
+    # Returns the current staff and student records, after an incremental load these are the changed records.
+    # Fused loads only keep them when keep_change_set is set
+    def getChangeSet(self):
+        if self.fused:
+            if self.fused_records is None:
+                logging.warning("Fused load records are not kept, set keep_change_set to get the change set")
+                return None
+            return {"staff": pandas.DataFrame(self.fused_records["staff"]),
+                    "student": pandas.DataFrame(self.fused_records["student"])}
+        return {"staff": self.staff_CSV, "student": self.student_CSV}
+
+    # Returns the condensed staff and student records saved for the next incremental load, so library callers can pass
+    # them back in as previous_staff_data and previous_student_data
+    def getCondensed(self):
+        return {"staff": self._condensedFrame("Staff"), "student": self._condensedFrame("Student")}
 
     # Removes Staff outside of the desired Staff Classes as well as those without barcodes
     def staffCondense(self):
         logging.info("Condensing Staff Records...")
 
-        skipped = 0
-        condensed_list = []
-        allowed_classes = ["0", "1", "2", "3", "4", "5", "7", "S", "B", "#"]
+        counts = {"skipped": 0}
+        # Removes records with duplicate EMPLID
+        deduped_condensed_list = self.staffDeDupe(
+            self._condenseStaff(self._iterRecords(self.staff_CSV), counts))
+
+        self.staff_CSV = pandas.DataFrame(deduped_condensed_list)
+        logging.info('Saved Records: %s', len(deduped_condensed_list))
+        logging.info('Skipped Records: %s', counts["skipped"])
 
-        for row in self.staff_CSV.itertuples():
-            patron = row._asdict()
+        # Keeps condensed staff data, it is saved for later comparison once the load has been prepared
+        self.condensed["Staff"] = self.staff_CSV
 
+        self._logElapsedTime()
+        logging.info("Staff Records Condensed\n")
+
+    # Yields Staff records from the allowed Staff Classes that have barcodes, counting the rest as skipped
+    def _condenseStaff(self, records, counts):
+        allowed_classes = ["0", "1", "2", "3", "4", "5", "7", "S", "B", "#"]
+
+        for patron in records:
             # Selects only records from allowed classes
             if patron["EmplClass"] in allowed_classes:
                 if not patron["barcode"] == '':
                     if not ((patron["EmplClass"] == "#") and (patron["um_nens_cat_code"] == "CNTEM")):
-                        condensed_list.append(patron)
+                        yield patron
                     else:
                         # print("Class: " + patron["EmplClass"] + " Status: " + patron["EmplStatus"] + " barcode: " + patron["barcode"])
-                        skipped += 1
+                        counts["skipped"] += 1
                 else:
                     # print("Class: " + patron["EmplClass"] + " Status: " + patron["EmplStatus"] + " barcode: " + patron["barcode"])
-                    skipped += 1
+                    counts["skipped"] += 1
             else:
                 # print("Class: " + patron["EmplClass"] + " Status: " + patron["EmplStatus"] + " barcode: " + patron["barcode"])
-                skipped += 1
-
-        # Removes records with duplicate EMPLID
-        deduped_condensed_list = self.staffDeDupe(condensed_list)
-
-        self.staff_CSV = pandas.DataFrame(deduped_condensed_list)
-        logging.info('Saved Records: %s', len(deduped_condensed_list))
-        logging.info('Skipped Records: %s', skipped)
-
-        # Saves condensed staff data for later comparison
-        logging.info("Saving Condensed Staff data...")
-        self.saveCurrentStaffData("Condensed", update_config=True)
-        logging.info("Condensed Staff Data Saved")
-
-        self._logElapsedTime()
-        logging.info("Staff Records Condensed\n")
+                counts["skipped"] += 1
 
     # Uses logic based on EmplStatus to select a record to load
     def staffDeDupe(self, records_in):
@@ -202,7 +647,7 @@ class PatronDataTransformer:
                             "B": "A"
                             }
 
-        records_in = sorted(records_in, key=lambda x: x["EMPLID"])
+        records_in = sorted(records_in, key=itemgetter("EMPLID"))
         records_out = []
         last_emplid = ""
         current_id_rows = []
@@ -275,79 +720,41 @@ class PatronDataTransformer:
     def studentCondense(self):
         logging.info("Condensing Student Records...")
         logging.info('Starting Record Count: %s', len(self.student_CSV))
-        skipped = 0
-        condensed_list = []
-
-        for row in self.student_CSV.itertuples():
-            patron = row._asdict()
-            if not patron["barcode"] == '':
-                condensed_list.append(patron)
-            else:
-                skipped += 1
+        counts = {"skipped": 0}
+        condensed_list = list(self._condenseStudents(self._iterRecords(self.student_CSV), counts))
 
         self.student_CSV = pandas.DataFrame(condensed_list)
 
         logging.info('Saved Records: %s', str(len(condensed_list)))
-        logging.info('Skipped Records: %s', str(skipped))
+        logging.info('Skipped Records: %s', str(counts["skipped"]))
 
-        logging.info("Saving Condensed Student data")
-        self.saveCurrentStudentData("Condensed", update_config=True)
-        logging.info("Condensed Student Data Saved")
+        # Keeps condensed student data, it is saved for later comparison once the load has been prepared
+        self.condensed["Student"] = self.student_CSV
         self._logElapsedTime()
         logging.info("Student Records Condensed\n")
 
+    # Yields Student records that have barcodes, counting the rest as skipped
+    def _condenseStudents(self, records, counts):
+        for patron in records:
+            if not patron["barcode"] == '':
+                yield patron
+            else:
+                counts["skipped"] += 1
+
     # Includes only records that differ from the previous Staff load
     def staffChanges(self):
         logging.info("Comparing Old and New Staff Files...")
         if not self.full_load:
-            old_staff = self.previous_staff_CSV.itertuples()
-            old_record = next(old_staff)._asdict()
-            new_staff = self.staff_CSV.itertuples()
-            new_record = next(new_staff)._asdict()
-
-            staff_changes = []
-            file_ends = {"old": False, "new": False}
-            updated = 0
-            new = 0
-            # Removed Address and Phone Number from diff comparison
-            compared_fields = ["EmplClass", "EmplStatus", "LastName", "FirstName", "MiddleName", "Email_Address", "barcode", "Pronoun"]
-
-            while (not file_ends["old"]) and (not file_ends["new"]):
-                next_old = False
-                next_new = False
-
-                if old_record["EMPLID"] < new_record["EMPLID"]:
-                    next_old = True
-                elif old_record["EMPLID"] > new_record["EMPLID"]:
-                    staff_changes.append(new_record)
-                    new += 1
-                    next_new = True
-                else:
-                    for compared_field in compared_fields:
-                        if str(old_record[compared_field]) != (new_record[compared_field]):
-                            logging.info('Updated Staff - EMPLID: %s, Modified field: %s', old_record["EMPLID"], compared_field)
-                            staff_changes.append(new_record)
-                            updated += 1
-                            break
-                    next_old = True
-                    next_new = True
-
-                if next_old and (not file_ends["old"]):
-                    try:
-                        old_record = next(old_staff)._asdict()
-                    except StopIteration:
-                        file_ends["old"] = True
-                if next_new and (not file_ends["new"]):
-                    try:
-                        new_record = next(new_staff)._asdict()
-                    except StopIteration:
-                        file_ends["new"] = True
+            counts = {"updated": 0, "new": 0}
+            staff_changes = list(self._changedRecords(self.previous_staff_CSV, self.previous_staff_file_name,
+                                                      self._iterRecords(self.staff_CSV),
+                                                      STAFF_COMPARED_FIELDS, "Staff", counts))
 
             self.staff_CSV = pandas.DataFrame(staff_changes)
 
             self.saveCurrentStaffData("Old-New-Compare")
-            logging.info('Updated: %s', updated)
-            logging.info('New: %s', new)
+            logging.info('Updated: %s', counts["updated"])
+            logging.info('New: %s', counts["new"])
             logging.info('Total Staff Changes Found: %s', len(staff_changes))
             self._logElapsedTime()
             logging.info("Old/New Staff comparison complete\n")
@@ -360,55 +767,15 @@ class PatronDataTransformer:
     def studentChanges(self):
         logging.info("Comparing Old and New Student Files...")
         if not self.full_load:
-            old_student = self.previous_student_CSV.itertuples()
-            old_record = next(old_student)._asdict()
-            new_student = self.student_CSV.itertuples()
-            new_record = next(new_student)._asdict()
-
-            student_changes = []
-            file_ends = {"old": False, "new": False}
-            updated = 0
-            new = 0
-            # Removed Address and Phone Number from diff comparison
-            compared_fields = ["AcadCareer1", "AcadCareer2", "AcadCareer3", "AcadProg1", "AcadProg2", "AcadProg3",
-                               "LastName", "FirstName", "MiddleName", "Email_Address", 
-                               "TermDescr1", "TermDescr2", "TermDescr3", "barcode", "Pronoun"]
-
-            while (not file_ends["old"]) and (not file_ends["new"]):
-                next_old = False
-                next_new = False
-
-                if old_record["EMPLID"] < new_record["EMPLID"]:
-                    next_old = True
-                elif old_record["EMPLID"] > new_record["EMPLID"]:
-                    student_changes.append(new_record)
-                    new += 1
-                    next_new = True
-                else:
-                    for compared_field in compared_fields:
-                        if str(old_record[compared_field]) != (new_record[compared_field]):
-                            logging.info('Updated Student - EMPLID: %s, Modified field: %s', old_record["EMPLID"], compared_field)
-                            student_changes.append(new_record)
-                            updated += 1
-                            break
-                    next_old = True
-                    next_new = True
-
-                if next_old and (not file_ends["old"]):
-                    try:
-                        old_record = next(old_student)._asdict()
-                    except StopIteration:
-                        file_ends["old"] = True
-                if next_new and (not file_ends["new"]):
-                    try:
-                        new_record = next(new_student)._asdict()
-                    except StopIteration:
-                        file_ends["new"] = True
+            counts = {"updated": 0, "new": 0}
+            student_changes = list(self._changedRecords(self.previous_student_CSV, self.previous_student_file_name,
+                                                        self._iterRecords(self.student_CSV),
+                                                        STUDENT_COMPARED_FIELDS, "Student", counts))
 
             self.student_CSV = pandas.DataFrame(student_changes)
             self.saveCurrentStudentData("Old-New-Compare")
-            logging.info('Updated: %s', updated)
-            logging.info('New: %s', new)
+            logging.info('Updated: %s', counts["updated"])
+            logging.info('New: %s', counts["new"])
             logging.info('Total Student Changes Found: %s',
                          str(len(student_changes)))
             self._logElapsedTime()
@@ -418,6 +785,240 @@ class PatronDataTransformer:
                 "\nIncremental load selected, student change comparison should not be performed\n")
             return -1
 
+    # Yields the previous condensed records, from the DataFrame passed in or streamed from the previous Condense file
+    # in chunks of sortBufferSize rows
+    def _iterPreviousRecords(self, previous_CSV, previous_file_name):
+        if previous_CSV is not None:
+            yield from self._iterRecords(previous_CSV)
+            return
+        with openPatronFile(previous_file_name) as file:
+            for chunk in pandas.read_csv(file, delimiter="|", dtype="string", chunksize=self.sort_buffer_size):
+                yield from self._iterRecords(chunk.fillna(""))
+
+    # Walks the previous records and the current records in EMPLID order, yielding current records that are new or
+    # differ in one of the compared fields
+    def _changedRecords(self, previous_CSV, previous_file_name, current_records, compared_fields, population, counts):
+        # The order of both inputs is verified before the walk, inputs not in EMPLID order are sorted first.
+        # Previous files are streamed, so only they go through the external sort
+        if isSortedRecords(self._iterPreviousRecords(previous_CSV, previous_file_name)):
+            old_records = self._iterPreviousRecords(previous_CSV, previous_file_name)
+        else:
+            logging.info('Previous %s records are not in EMPLID order, sorting...', population)
+            if previous_CSV is not None:
+                old_records = iter(sorted(self._iterRecords(previous_CSV), key=itemgetter("EMPLID")))
+            else:
+                old_records = externalSortRecords(self._iterPreviousRecords(previous_CSV, previous_file_name),
+                                                  buffer_size=self.sort_buffer_size)
+        if previous_file_name is not None:
+            self._countBytesRead(previous_file_name)
+        current_records = list(current_records)
+        if not isSortedRecords(current_records):
+            logging.info('Current %s records are not in EMPLID order, sorting...', population)
+            current_records.sort(key=itemgetter("EMPLID"))
+        new_records = iter(current_records)
+        file_ends = {"old": False, "new": False}
+        try:
+            new_record = next(new_records)
+        except StopIteration:
+            file_ends["new"] = True
+        try:
+            old_record = next(old_records)
+        except StopIteration:
+            file_ends["old"] = True
+
+        while (not file_ends["old"]) and (not file_ends["new"]):
+            next_old = False
+            next_new = False
+
+            if old_record["EMPLID"] < new_record["EMPLID"]:
+                next_old = True
+            elif old_record["EMPLID"] > new_record["EMPLID"]:
+                yield new_record
+                counts["new"] += 1
+                next_new = True
+            else:
+                for compared_field in compared_fields:
+                    if str(old_record[compared_field]) != (new_record[compared_field]):
+                        logging.info('Updated %s - EMPLID: %s, Modified field: %s', population, old_record["EMPLID"], compared_field)
+                        yield new_record
+                        counts["updated"] += 1
+                        break
+                next_old = True
+                next_new = True
+
+            if next_old and (not file_ends["old"]):
+                try:
+                    old_record = next(old_records)
+                except StopIteration:
+                    file_ends["old"] = True
+            if next_new and (not file_ends["new"]):
+                try:
+                    new_record = next(new_records)
+                except StopIteration:
+                    file_ends["new"] = True
+
+        # Current records past the last previous EMPLID are all new
+        if not file_ends["new"]:
+            yield new_record
+            counts["new"] += 1
+            for new_record in new_records:
+                yield new_record
+                counts["new"] += 1
+
+    # Finds patrons sharing a barcode or username across both populations and resolves them using the uniquenessPolicy:
+    # drop removes every patron involved, keep-first keeps patrons in load order (staff first) as long as none of their
+    # values is held by a patron kept before them, fail stops the load. With a state store, values last sent for
+    # patrons who are not part of this load count as held as well. Repeated records for the same EMPLID are not a
+    # conflict, the first one is kept and the repeats are reported as collapsed
+    def uniquenessCheck(self):
+        logging.info("Checking barcode and username uniqueness...")
+        patrons = [("Staff", patron) for patron in self.staff_out] + [("Student", patron) for patron in self.student_out]
+        load_emplids = set()
+        repeated = set()
+        for position, (_, patron) in enumerate(patrons):
+            emplid = PatronStateStore.patronEMPLID(patron)
+            if emplid in load_emplids:
+                repeated.add(position)
+            else:
+                load_emplids.add(emplid)
+        checked = [position for position in range(len(patrons)) if position not in repeated]
+
+        # Usernames are email addresses, so they are compared case-insensitively
+        unique_fields = {"barcode": lambda patron: patron["barcode"],
+                         "username": lambda patron: patron["username"].casefold()}
+        conflicting = {}
+        stored_owners = {}
+        for field, field_value in unique_fields.items():
+            index = {}
+            for position in checked:
+                value = field_value(patrons[position][1])
+                if value != "":
+                    index.setdefault(value, []).append(position)
+
+            stored_owners[field] = {}
+            if self.state_store is not None:
+                for value, emplid in self.state_store.getOwners(field, index.keys()):
+                    if emplid not in load_emplids:
+                        stored_owners[field][value.casefold() if field == "username" else value] = emplid
+            conflicting[field] = {value: positions for value, positions in index.items()
+                                  if len(positions) > 1 or value in stored_owners[field]}
+
+        involved = sorted({position for field_conflicts in conflicting.values()
+                           for positions in field_conflicts.values() for position in positions})
+        if self.uniqueness_policy == "keep-first":
+            dropped = set()
+            claimed = {field: set(stored_owners[field]) for field in unique_fields}
+            for position in involved:
+                _, patron = patrons[position]
+                values = {field: field_value(patron) for field, field_value in unique_fields.items()}
+                if any(values[field] in claimed[field] for field in unique_fields):
+                    dropped.add(position)
+                else:
+                    for field, value in values.items():
+                        if value != "":
+                            claimed[field].add(value)
+        else:
+            dropped = set(involved)
+
+        # Each patron's final action is reported for every value it conflicts on
+        self.conflicts = []
+        for field, field_conflicts in conflicting.items():
+            for value, positions in field_conflicts.items():
+                for position in positions:
+                    population, patron = patrons[position]
+                    if position not in dropped:
+                        action = "kept"
+                    else:
+                        action = "rejected" if self.uniqueness_policy == "fail" else "dropped"
+                    logging.warning('Duplicate %s - %s, EMPLID: %s, %s, %s',
+                                    field, patron[field], PatronStateStore.patronEMPLID(patron), population, action)
+                    self.conflicts.append({"field": field,
+                                           "value": patron[field],
+                                           "EMPLID": PatronStateStore.patronEMPLID(patron),
+                                           "population": population,
+                                           "action": action})
+                if value in stored_owners[field]:
+                    logging.warning('Duplicate %s - %s, EMPLID: %s, already sent',
+                                    field, value, stored_owners[field][value])
+                    self.conflicts.append({"field": field,
+                                           "value": value,
+                                           "EMPLID": stored_owners[field][value],
+                                           "population": "State Store",
+                                           "action": "existing"})
+        conflict_count = len(self.conflicts)
+
+        for position in sorted(repeated):
+            population, patron = patrons[position]
+            emplid = PatronStateStore.patronEMPLID(patron)
+            logging.warning('Repeated EMPLID - %s, %s, collapsed', emplid, population)
+            self.conflicts.append({"field": "EMPLID",
+                                   "value": emplid,
+                                   "EMPLID": emplid,
+                                   "population": population,
+                                   "action": "collapsed"})
+
+        self.dropped_emplids = {PatronStateStore.patronEMPLID(patrons[position][1]) for position in dropped}
+        logging.info('Uniqueness conflicts found: %s', conflict_count)
+        self.saveConflictReport()
+        if conflict_count and self.uniqueness_policy == "fail":
+            logging.critical('Duplicate barcodes or usernames found, load file will not be saved')
+            raise ValueError('Duplicate barcodes or usernames found')
+        if dropped or repeated:
+            left_out = dropped | repeated
+            # Filters in place so staff_out/student_out keep referring to the same lists
+            self.staff_out[:] = [patron for position, (population, patron) in enumerate(patrons)
+                                 if population == "Staff" and position not in left_out]
+            self.student_out[:] = [patron for position, (population, patron) in enumerate(patrons)
+                                   if population == "Student" and position not in left_out]
+            logging.info('Patron Records dropped: %s', len(dropped))
+            logging.info('Repeated Patron Records collapsed: %s', len(repeated))
+
+        self._logElapsedTime()
+        logging.info("Uniqueness check complete\n")
+
+    # Saves the barcode and username conflicts found by uniquenessCheck as a csv, a clean load saves an empty report
+    def saveConflictReport(self):
+        if not self.persist:
+            return
+        file = f"{os.getenv('loadProcessDirectory')}/Patron-Conflicts.csv{self.compression_extension}"
+        logging.info('Saving conflict report to: %s', file)
+        with openPatronFile(file, 'w', self.compression_level, newline='') as outfile:
+            pandas.DataFrame(self.conflicts, columns=["field", "value", "EMPLID", "population", "action"]).to_csv(
+                outfile, index=False, sep="|")
+        self._countBytesWritten(file)
+
+    # Compares converted records with the last records sent, incremental loads keep only new and changed records
+    def outputChanges(self):
+        if self.state_store is None:
+            logging.warning("\nNo patron state store configured, output comparison cannot be performed\n")
+            return -1
+
+        logging.info("Comparing converted records with the patron state store...")
+        for population, patrons in (("Staff", self.staff_out), ("Student", self.student_out)):
+            stored_digests = self.state_store.getDigests(
+                PatronStateStore.patronEMPLID(patron) for patron in patrons)
+            changed = []
+            updated = 0
+            new = 0
+            for patron in patrons:
+                stored_digest = stored_digests.get(PatronStateStore.patronEMPLID(patron))
+                if stored_digest is None:
+                    new += 1
+                    changed.append(patron)
+                elif stored_digest != PatronStateStore.patronDigest(patron):
+                    updated += 1
+                    changed.append(patron)
+
+            logging.info('%s Output Updated: %s', population, updated)
+            logging.info('%s Output New: %s', population, new)
+            logging.info('%s Output Unchanged: %s', population, len(patrons) - len(changed))
+            if not self.full_load:
+                # Filters in place so staff_out/student_out keep referring to the same lists
+                patrons[:] = changed
+
+        self._logElapsedTime()
+        logging.info("Output comparison complete\n")
+
     # Compares both sets of patron records and appropriately removes records
     def recordComparisons(self):
         if (self.staff_CSV.keys().tolist() == []) or (self.student_CSV.keys().tolist() == []):
@@ -427,44 +1028,23 @@ class PatronDataTransformer:
 
         logging.info("Beginning Student/Staff record comparison...\n")
 
-        staff_removed = 0
-        staff_remaining = []
-        student_ids = self.student_CSV["EMPLID"].tolist()
-
-        # Removes Terminated (T) and Suspended (S) Staff who appear in the student load
-        for record in self.staff_CSV.itertuples():
-            staff = record._asdict()
-            if staff["EmplStatus"] != "T" and staff["EmplStatus"] != "S":
-                staff_remaining.append(staff)
-            else:
-                if staff["EMPLID"] in student_ids:
-                    staff_removed += 1
-                else:
-                    staff_remaining.append(staff)
+        counts = {"staff_removed": 0, "students_removed": 0}
+        student_ids = set(self.student_CSV["EMPLID"].tolist())
+        staff_remaining = list(self._removeStaffStudents(self._iterRecords(self.staff_CSV), student_ids, counts))
         self.staff_CSV = pandas.DataFrame(staff_remaining)
 
         logging.info(
-            f"Starting Staff Record Count: {str(staff_removed + len(staff_remaining))}")
-        logging.info(f"Staff Records Removed: {str(staff_removed)}")
+            f"Starting Staff Record Count: {str(counts['staff_removed'] + len(staff_remaining))}")
+        logging.info(f"Staff Records Removed: {str(counts['staff_removed'])}")
         logging.info(f"Staff Records Remaining: {str(len(staff_remaining))}")
 
-        students_removed = 0
-        students_remaining = []
-        staff_ids = self.staff_CSV["EMPLID"].tolist()
-
-        # Removes Students who appear in the Staff load
-        for record in self.student_CSV.itertuples():
-            student = record._asdict()
-
-            if not student["EMPLID"] in staff_ids:
-                students_remaining.append(student)
-            else:
-                students_removed += 1
+        staff_ids = {staff["EMPLID"] for staff in staff_remaining}
+        students_remaining = list(self._removeStudentStaff(self._iterRecords(self.student_CSV), staff_ids, counts))
         self.student_CSV = pandas.DataFrame(students_remaining)
 
         logging.info(
-            f"Starting Student Records: {str(students_removed + len(students_remaining))}")
-        logging.info(f"Student Records Removed: {str(students_removed)}")
+            f"Starting Student Records: {str(counts['students_removed'] + len(students_remaining))}")
+        logging.info(f"Student Records Removed: {str(counts['students_removed'])}")
         logging.info(
             f"Student Records Remaining: {str(len(students_remaining))}\n")
 
@@ -476,6 +1056,25 @@ class PatronDataTransformer:
         self._logElapsedTime()
         logging.info("Student/Staff record comparison complete\n")
 
+    # Removes Terminated (T) and Suspended (S) Staff who appear in the student load
+    def _removeStaffStudents(self, staff_records, student_ids, counts):
+        for staff in staff_records:
+            if staff["EmplStatus"] != "T" and staff["EmplStatus"] != "S":
+                yield staff
+            else:
+                if staff["EMPLID"] in student_ids:
+                    counts["staff_removed"] += 1
+                else:
+                    yield staff
+
+    # Removes Students who appear in the Staff load
+    def _removeStudentStaff(self, student_records, staff_ids, counts):
+        for student in student_records:
+            if not student["EMPLID"] in staff_ids:
+                yield student
+            else:
+                counts["students_removed"] += 1
+
     # Converts Student records to FOLIO's json format and saves it in the output file
     def transformStudentRecords(self):
         if self.student_CSV.keys().tolist() == []:
@@ -485,156 +1084,14 @@ class PatronDataTransformer:
 
         logging.info("Converting Student records to json...\n")
 
-        defaulted = 0
-
+        counts = {"defaulted": 0}
         # Iterates through all patron records
-        for row in self.student_CSV.itertuples():
-            student = row._asdict()
-
-            # Logic for determining Patron Group, prioritizes highest level programs of study then latest graduation date.
-            default_patron_group = "Undergraduate"
-            grad_date = "UNKNOWN"
-            if (student['AcadProg1'] == '' and student['AcadProg2'] == '' and student['AcadProg3'] == ''):
-                active = False
-                patron_group = default_patron_group
-                expire_date= datetime.now().strftime('%Y-%m-%d')
-            else:
-                active = True
-                academic_career = [student["AcadCareer1"],
-                                student["AcadCareer2"],
-                                student["AcadCareer3"]]
-                academic_programs = [student["AcadProg1"],
-                                    student["AcadProg2"],
-                                    student["AcadProg3"]]
-                grad_terms = [student["TermDescr1"],
-                            student["TermDescr2"],
-                            student["TermDescr3"]]
-                graduate_options = []
-                undergraduate_options = []
-                for index, option in enumerate(academic_career):
-                    if option == "GRAD":
-                        graduate_options.append(grad_terms[index])
-                    if option == "ND":
-                        program = academic_programs[index]
-                        if program == "ND-ST":
-                            undergraduate_options.append(grad_terms[index])
-                        elif program == "ND-UG":
-                            undergraduate_options.append(grad_terms[index])
-                        elif program == "ND-CE":
-                            undergraduate_options.append(grad_terms[index])
-                        elif program == "ND-GR":
-                            graduate_options.append(grad_terms[index])          
-                    if option == "UGRD":
-                        undergraduate_options.append(grad_terms[index])
-                    if option == "NC":
-                        if academic_programs[index] == "NC-LL":
-                            undergraduate_options.append(grad_terms[index])
-                years = []
-                semesters = []
-                if graduate_options and graduate_options != ['']:
-                    patron_group = "Graduate"
-                    for option in graduate_options:
-                        if option != '':
-                            years.append(option[-4:])
-                            if option[:-5] == 'Sprng':
-                                semesters.append(4)
-                            elif option[:-5] == 'Summr':
-                                semesters.append(3)
-                            elif option[:-5] == 'Fall':
-                                semesters.append(2)
-                            elif option[:-5] == 'Wintr':
-                                semesters.append(1)
-                            else:
-                                logging.warning(
-                                    'Malformed Graduation Date: %s', option)
-                    if len(years) == 0:
-                        defaulted += 1
-                        patron_group = default_patron_group
-                        max_year = datetime.now().year + 1
-                        semester = 0
-                    else:
-                        max_year = max(years)
-                        semester = max([semesters[index] for index,
-                                    year in enumerate(years) if year == max_year])
-                elif undergraduate_options and undergraduate_options != ['']:
-                    patron_group = "Undergraduate"
-                    for option in undergraduate_options:
-                        if option != '':
-                            years.append(option[-4:])
-                            if option[:-5] == 'Sprng':
-                                semesters.append(4)
-                            elif option[:-5] == 'Summr':
-                                semesters.append(3)
-                            elif option[:-5] == 'Fall':
-                                semesters.append(2)
-                            elif option[:-5] == 'Wintr':
-                                semesters.append(1)
-                            else:
-                                logging.warning(
-                                    'Malformed Graduation Date: %s', option)
-                    if len(years) == 0:
-                        defaulted += 1
-                        patron_group = default_patron_group
-                        max_year = datetime.now().year + 1
-                        semester = 0
-                    else:
-                        max_year = max(years)
-                        semester = max([semesters[index] for index,
-                                    year in enumerate(years) if year == max_year])
-                else:
-                    defaulted += 1
-                    patron_group = default_patron_group
-                    max_year = datetime.now().year + 1
-                    semester = 0
-
-                if semester == 0:
-                    expiration_day = datetime.today() + relativedelta(years=2)
-                    expire_date = f'{expiration_day.year:04}-{expiration_day.month:02}-{expiration_day.day:02}'
-                elif semester == 1:
-                    grad_date = f'Winter {max_year}'
-                    expire_date = f'{int(max_year)+1}-02-15'
-                elif semester == 2:
-                    grad_date = f'Fall {max_year}'
-                    expire_date = f'{int(max_year)+1}-01-15'
-                elif semester == 3:
-                    grad_date = f'Summer {max_year}'
-                    expire_date = f'{max_year}-09-15'
-                elif semester == 4:
-                    grad_date = f'Spring {max_year}'
-                    expire_date = f'{max_year}-06-05'
-            if student["Pronoun"].strip() == 'undisclose':
-                pronoun = ""
-            else:
-                pronoun = student["Pronoun"].strip()
-            # Maps each patron's data into a list to be added to the output file
-            patron_json = {
-                "username": student["Email_Address"],
-                "externalSystemId": str(student["EMPLID"]) + "@umass.edu",
-                "barcode": student["barcode"],
-                "active": active,
-                "patronGroup": patron_group,
-                "departments": [],
-                "personal":
-                    {
-                        "pronouns":pronoun,
-                        "lastName": student["LastName"],
-                        "firstName": student["FirstName"],
-                        "middleName": student["MiddleName"],
-                        "email": student["Email_Address"], # Removed Addresses and Phone Numbers
-                        "preferredContactTypeId": "Email"
-                },
-                "expirationDate": expire_date, # If this needs to validate as date-time append "T00:00:00.000+00:00"
-                "customFields": {
-                    "institution": "UMass Amherst",
-                    "graduationDate": grad_date
-                }
-            }
-
-            self.student_out.append(patron_json)
+        for student in self._iterRecords(self.student_CSV):
+            self.student_out.append(self._transformStudent(student, counts))
 
         # Logs Statistics and Saves data to output file
         logging.info(
-            'Students defaulted to the \'Undergraduate\' patron group: %s', str(defaulted))
+            'Students defaulted to the \'Undergraduate\' patron group: %s', str(counts["defaulted"]))
         logging.info('%s Student Records Converted', len(self.student_out))
         self._logElapsedTime()
         logging.info("Student Records converted successfully\n")
@@ -647,114 +1104,312 @@ class PatronDataTransformer:
             return -1
 
         logging.info("Converting Staff records to json...\n")
-        default_patron_group = "Staff"
-        defaulted = 0
-        no_barcode = 0
-        for row in self.staff_CSV.itertuples():
-            staff = row._asdict()
-
-            # Assigns Patron Group
-            if staff["EmplClass"] in ["0", "1"]:
-                patron_group = "Faculty"
-            elif staff["EmplClass"] in ["S", "2", "3", "4", "5", "7"]:
-                patron_group = "Staff"
-            elif staff["EmplClass"] == "#":
-                patron_group = default_patron_group
-                defaulted += 1
-            else:
-                patron_group = default_patron_group
-                defaulted += 1
-            today = datetime.today()
-            try:
-                expiration_day = today.replace(year=today.year + 2)
-            except ValueError:
-                expiration_day = today + \
-                    (date(today.year + 2, 1, 1) - date(today.year, 1, 1))
-            expiration_date = f'{expiration_day.year:04}-{expiration_day.month:02}-{expiration_day.day:02}'
-
-            # Checks Patron Status and existence of a Barcode
-            if staff["EmplStatus"] == "T" or staff["EmplStatus"] == "D":
-                if self.full_load:
-                    continue
-                active = False
-            else:
-                active = True
-            if staff["barcode"] == "":
-                no_barcode += 1
+        counts = {"defaulted": 0, "no_barcode": 0}
+        for staff in self._iterRecords(self.staff_CSV):
+            patron_json = self._transformStaff(staff, counts)
+            if patron_json is not None:
+                self.staff_out.append(patron_json)
 
-            if staff["Email_Address"] == "":
-                email = str(staff["EMPLID"]) + "@umass.edu"
-            else:
-                email = staff["Email_Address"]
+        logging.info('Staff with no barcodes: %s', counts["no_barcode"])
+        logging.info(
+            'Staff defaulted to the \'Staff\' patron group: %s', counts["defaulted"])
+        logging.info('%s Staff Records Converted', len(self.staff_out))
+        self._logElapsedTime()
+        logging.info("Staff Records converted successfully\n")
 
-            if staff["Pronoun"].strip() == "undisclose":
-                pronoun = ""
+    # Converts a single Student record to FOLIO's json format
+    def _transformStudent(self, student, counts):
+        # Logic for determining Patron Group, prioritizes highest level programs of study then latest graduation date.
+        default_patron_group = "Undergraduate"
+        grad_date = "UNKNOWN"
+        if (student['AcadProg1'] == '' and student['AcadProg2'] == '' and student['AcadProg3'] == ''):
+            active = False
+            patron_group = default_patron_group
+            expire_date= datetime.now().strftime('%Y-%m-%d')
+        else:
+            active = True
+            academic_career = [student["AcadCareer1"],
+                            student["AcadCareer2"],
+                            student["AcadCareer3"]]
+            academic_programs = [student["AcadProg1"],
+                                student["AcadProg2"],
+                                student["AcadProg3"]]
+            grad_terms = [student["TermDescr1"],
+                        student["TermDescr2"],
+                        student["TermDescr3"]]
+            graduate_options = []
+            undergraduate_options = []
+            for index, option in enumerate(academic_career):
+                if option == "GRAD":
+                    graduate_options.append(grad_terms[index])
+                if option == "ND":
+                    program = academic_programs[index]
+                    if program == "ND-ST":
+                        undergraduate_options.append(grad_terms[index])
+                    elif program == "ND-UG":
+                        undergraduate_options.append(grad_terms[index])
+                    elif program == "ND-CE":
+                        undergraduate_options.append(grad_terms[index])
+                    elif program == "ND-GR":
+                        graduate_options.append(grad_terms[index])          
+                if option == "UGRD":
+                    undergraduate_options.append(grad_terms[index])
+                if option == "NC":
+                    if academic_programs[index] == "NC-LL":
+                        undergraduate_options.append(grad_terms[index])
+            years = []
+            semesters = []
+            if graduate_options and graduate_options != ['']:
+                patron_group = "Graduate"
+                for option in graduate_options:
+                    if option != '':
+                        years.append(option[-4:])
+                        if option[:-5] == 'Sprng':
+                            semesters.append(4)
+                        elif option[:-5] == 'Summr':
+                            semesters.append(3)
+                        elif option[:-5] == 'Fall':
+                            semesters.append(2)
+                        elif option[:-5] == 'Wintr':
+                            semesters.append(1)
+                        else:
+                            logging.warning(
+                                'Malformed Graduation Date: %s', option)
+                if len(years) == 0:
+                    counts["defaulted"] += 1
+                    patron_group = default_patron_group
+                    max_year = datetime.now().year + 1
+                    semester = 0
+                else:
+                    max_year = max(years)
+                    semester = max([semesters[index] for index,
+                                year in enumerate(years) if year == max_year])
+            elif undergraduate_options and undergraduate_options != ['']:
+                patron_group = "Undergraduate"
+                for option in undergraduate_options:
+                    if option != '':
+                        years.append(option[-4:])
+                        if option[:-5] == 'Sprng':
+                            semesters.append(4)
+                        elif option[:-5] == 'Summr':
+                            semesters.append(3)
+                        elif option[:-5] == 'Fall':
+                            semesters.append(2)
+                        elif option[:-5] == 'Wintr':
+                            semesters.append(1)
+                        else:
+                            logging.warning(
+                                'Malformed Graduation Date: %s', option)
+                if len(years) == 0:
+                    counts["defaulted"] += 1
+                    patron_group = default_patron_group
+                    max_year = datetime.now().year + 1
+                    semester = 0
+                else:
+                    max_year = max(years)
+                    semester = max([semesters[index] for index,
+                                year in enumerate(years) if year == max_year])
             else:
-                pronoun = staff["Pronoun"].strip()
-
-            patron_json = {
-                "username": email,
-                "externalSystemId": str(staff["EMPLID"]) + "@umass.edu",
-                "barcode": staff["barcode"],
-                "active": active,
-                "patronGroup": patron_group,
-                "departments": [],
-                "personal":
-                    {
-                        "pronouns": pronoun,
-                        "lastName": staff["LastName"],
-                        "firstName": staff["FirstName"],
-                        "middleName": staff["MiddleName"],
-                        "email": email, # Removed Addresses & Phone Number
-                        "preferredContactTypeId": "Email"
-                },
-                "expirationDate": expiration_date, # If this needs to validate as date-time append "T00:00:00.000+00:00"
-                "customFields": {
-                    "institution": "UMass Amherst"
-                }
+                counts["defaulted"] += 1
+                patron_group = default_patron_group
+                max_year = datetime.now().year + 1
+                semester = 0
+
+            if semester == 0:
+                expiration_day = datetime.today() + relativedelta(years=2)
+                expire_date = f'{expiration_day.year:04}-{expiration_day.month:02}-{expiration_day.day:02}'
+            elif semester == 1:
+                grad_date = f'Winter {max_year}'
+                expire_date = f'{int(max_year)+1}-02-15'
+            elif semester == 2:
+                grad_date = f'Fall {max_year}'
+                expire_date = f'{int(max_year)+1}-01-15'
+            elif semester == 3:
+                grad_date = f'Summer {max_year}'
+                expire_date = f'{max_year}-09-15'
+            elif semester == 4:
+                grad_date = f'Spring {max_year}'
+                expire_date = f'{max_year}-06-05'
+        if student["Pronoun"].strip() == 'undisclose':
+            pronoun = ""
+        else:
+            pronoun = student["Pronoun"].strip()
+        # Maps each patron's data into a list to be added to the output file
+        patron_json = {
+            "username": student["Email_Address"],
+            "externalSystemId": str(student["EMPLID"]) + "@umass.edu",
+            "barcode": student["barcode"],
+            "active": active,
+            "patronGroup": patron_group,
+            "departments": [],
+            "personal":
+                {
+                    "pronouns":pronoun,
+                    "lastName": student["LastName"],
+                    "firstName": student["FirstName"],
+                    "middleName": student["MiddleName"],
+                    "email": student["Email_Address"], # Removed Addresses and Phone Numbers
+                    "preferredContactTypeId": "Email"
+            },
+            "expirationDate": expire_date, # If this needs to validate as date-time append "T00:00:00.000+00:00"
+            "customFields": {
+                "institution": "UMass Amherst",
+                "graduationDate": grad_date
             }
+        }
 
-            self.staff_out.append(patron_json)
+        return patron_json
 
-        logging.info('Staff with no barcodes: %s', no_barcode)
-        logging.info(
-            'Staff defaulted to the \'Staff\' patron group: %s', defaulted)
-        logging.info('%s Staff Records Converted', len(self.staff_out))
-        self._logElapsedTime()
-        logging.info("Staff Records converted successfully\n")
+    # Converts a single Staff record to FOLIO's json format, returns None for records that are left out of the load
+    def _transformStaff(self, staff, counts):
+        default_patron_group = "Staff"
+
+        # Assigns Patron Group
+        if staff["EmplClass"] in ["0", "1"]:
+            patron_group = "Faculty"
+        elif staff["EmplClass"] in ["S", "2", "3", "4", "5", "7"]:
+            patron_group = "Staff"
+        elif staff["EmplClass"] == "#":
+            patron_group = default_patron_group
+            counts["defaulted"] += 1
+        else:
+            patron_group = default_patron_group
+            counts["defaulted"] += 1
+        today = datetime.today()
+        try:
+            expiration_day = today.replace(year=today.year + 2)
+        except ValueError:
+            expiration_day = today + \
+                (date(today.year + 2, 1, 1) - date(today.year, 1, 1))
+        expiration_date = f'{expiration_day.year:04}-{expiration_day.month:02}-{expiration_day.day:02}'
+
+        # Checks Patron Status and existence of a Barcode
+        # Full loads leave out Terminated and Deceased staff, with a state store they are still recorded there so
+        # later incremental loads only send them once their record changes
+        left_out = False
+        if staff["EmplStatus"] == "T" or staff["EmplStatus"] == "D":
+            if self.full_load:
+                if self.state_store is None:
+                    return None
+                left_out = True
+            active = False
+        else:
+            active = True
+        if staff["barcode"] == "" and not left_out:
+            counts["no_barcode"] += 1
+
+        if staff["Email_Address"] == "":
+            email = str(staff["EMPLID"]) + "@umass.edu"
+        else:
+            email = staff["Email_Address"]
+
+        if staff["Pronoun"].strip() == "undisclose":
+            pronoun = ""
+        else:
+            pronoun = staff["Pronoun"].strip()
+
+        patron_json = {
+            "username": email,
+            "externalSystemId": str(staff["EMPLID"]) + "@umass.edu",
+            "barcode": staff["barcode"],
+            "active": active,
+            "patronGroup": patron_group,
+            "departments": [],
+            "personal":
+                {
+                    "pronouns": pronoun,
+                    "lastName": staff["LastName"],
+                    "firstName": staff["FirstName"],
+                    "middleName": staff["MiddleName"],
+                    "email": email, # Removed Addresses & Phone Number
+                    "preferredContactTypeId": "Email"
+            },
+            "expirationDate": expiration_date, # If this needs to validate as date-time append "T00:00:00.000+00:00"
+            "customFields": {
+                "institution": "UMass Amherst"
+            }
+        }
+
+        if left_out:
+            self.staff_left_out.append(patron_json)
+            return None
+
+        return patron_json
+
+    # Saves the condensed staff and student data for the next incremental load and points the config at it. Patrons
+    # left out of this load by uniquenessCheck are left out of the saved data, so the next load sends them as new
+    def saveCondensedData(self):
+        logging.info("Saving Condensed data...")
+        for population in ("Staff", "Student"):
+            self._saveFrame(population, "Condensed", self._condensedFrame(population), update_config=True)
+        logging.info("Condensed Data Saved")
+
+    # Returns the condensed records of a population as a DataFrame, without the EMPLIDs dropped by uniquenessCheck
+    def _condensedFrame(self, population):
+        condensed = self.condensed[population]
+        if condensed is None:
+            return None
+        if not isinstance(condensed, pandas.DataFrame):
+            condensed = pandas.DataFrame(condensed)
+        if self.dropped_emplids and "EMPLID" in condensed.columns:
+            condensed = condensed[~condensed["EMPLID"].isin(self.dropped_emplids)]
+        return condensed
 
     # Saves Current Staff Data as a csv and triggers a config update if indicated for condensed files
     def saveCurrentStaffData(self, load_step, update_config=False):
-        file = f"{os.getenv('loadProcessDirectory')}/Staff-{load_step}.csv"
-        logging.info('Saving Staff %s to: %s', load_step, file)
-        self.staff_CSV.to_csv(file, index=False, sep="|")
-        if update_config and load_step == "Condensed":
-            self._updateConfig("previousStaffCondense", file)
+        self._saveFrame("Staff", load_step, self.staff_CSV, update_config)
 
     # Saves Current student data as a csv and triggers a config update if indicated for condensed files
     def saveCurrentStudentData(self, load_step, update_config=False):
-        file = f"{os.getenv('loadProcessDirectory')}/Student-{load_step}.csv"
-        logging.info('Saving Student %s to: %s', load_step, file)
-        self.student_CSV.to_csv(file, index=False, sep="|")
+        self._saveFrame("Student", load_step, self.student_CSV, update_config)
+
+    # Saves a fused load's records for a load step if it is one of the requested checkpoints. Returns the records,
+    # as a list when they had to be gathered up for saving
+    def _checkpoint(self, population, load_step, records):
+        if not self.persist or load_step not in self.checkpoints:
+            return records
+        records = list(records)
+        self._saveFrame(population, load_step, pandas.DataFrame(records), update_config=False)
+        return records
+
+    def _saveFrame(self, population, load_step, frame, update_config):
+        if not self.persist:
+            return
+        file = f"{os.getenv('loadProcessDirectory')}/{population}-{load_step}.csv{self.compression_extension}"
+        logging.info('Saving %s %s to: %s', population, load_step, file)
+        with openPatronFile(file, 'w', self.compression_level, newline='') as outfile:
+            frame.to_csv(outfile, index=False, sep="|")
+        self._countBytesWritten(file)
         if update_config and load_step == "Condensed":
-            self._updateConfig("previousStudentCondense", file)
+            self._updateConfig(f"previous{population}Condense", file)
 
     # Saves Current Staff and Student data together in a json file that is ready-to-load
     def saveLoadData(self):
+        if not self.persist:
+            logging.info('%s Patron Records kept in memory', len(self.staff_out) + len(self.student_out))
+            self._updateStateStore()
+            return
         #Saves file for current load
-        with open(self.patron_out_file_name, 'w', encoding='utf-8') as outfile:
-            for staff in self.staff_out:
-                outfile.write(f"{json.dumps(staff)}\n")
-            for student in self.student_out:
-                outfile.write(f"{json.dumps(student)}\n")
+        self._writeLoadFile(self.patron_out_file_name)
         #Saves dated file for future auditing
-        with open(self.dated_out_file_name, 'w', encoding='utf-8') as outfile:
+        self._writeLoadFile(self.dated_out_file_name)
+        logging.info('Patron Records saved to: %s', self.patron_out_file_name)
+        logging.info('Patron Records also saved to: %s', self.dated_out_file_name)
+        self._updateStateStore()
+
+    # Writes the prepared patron records to a load file one json line at a time
+    def _writeLoadFile(self, file_name):
+        with openPatronFile(file_name, 'w', self.compression_level) as outfile:
             for staff in self.staff_out:
                 outfile.write(f"{json.dumps(staff)}\n")
             for student in self.student_out:
                 outfile.write(f"{json.dumps(student)}\n")
-        logging.info('Patron Records saved to: %s', self.patron_out_file_name)
-        logging.info('Patron Records also saved to: %s', self.dated_out_file_name)
+        self._countBytesWritten(file_name)
+
+    # Records the patron json that was just prepared as the last json sent for each EMPLID
+    def _updateStateStore(self):
+        if self.state_store is not None:
+            self.state_store.upsertPatrons(self.getPatronRecords() + self.staff_left_out)
 
 
 if __name__ == "__main__":